@@ -1,29 +1,84 @@
 import os
+import shutil
+import uuid
 from flask import Flask, render_template, request, redirect, url_for, session, send_file, jsonify
 from werkzeug.utils import secure_filename
 import pandas as pd
 import json
+import hashlib
 from datetime import datetime
 
 from src.data_processor import DataProcessor
 from src.clustering import ClusteringAlgorithms
 from src.visualization import Visualizer
+from src.incremental import IncrementalClustering
+from src.storage import StorageManager
+from src.utils import track_peak_memory, append_rows
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads/'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['RESULTS_FOLDER'] = 'results/'
+app.config['MODELS_FOLDER'] = 'models/'
+app.config['CACHE_FOLDER'] = 'cache/'
+app.config['COMPUTE_DTYPE'] = 'float32'  # тип матрицы при масштабировании, кластеризации и расчете метрик
+app.config['PROFILE_MEMORY'] = False  # замер пиковой памяти по этапам (замедляет обработку)
+app.config['PARALLEL_N_JOBS'] = -1  # процессов для сравнения и анализа устойчивости (-1 - все ядра)
+app.config['COMPARE_MAX_QUADRATIC_ROWS'] = 10000  # предел строк для hierarchical и spectral: сравнение отказывает, оценка устойчивости идет в один процесс
+app.config['STABILITY_RUNS'] = 50  # максимум повторных обучений при анализе устойчивости
+app.config['STABILITY_TIME_BUDGET'] = 60  # ограничение времени анализа устойчивости, с
+app.config['STORAGE_MAX_BYTES'] = 2 * 1024 * 1024 * 1024  # квота на uploads/, results/, models/, cache/
+app.config['STORAGE_MAX_AGE'] = 7 * 24 * 3600  # удаление файлов без обращений дольше, с
+app.config['STORAGE_MIN_IDLE'] = 600  # файлы, использованные недавно, не вытесняются, с
+app.config['STORAGE_GC_INTERVAL'] = 300  # период фоновой сборки мусора, с
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+os.makedirs(app.config['MODELS_FOLDER'], exist_ok=True)
+os.makedirs(app.config['CACHE_FOLDER'], exist_ok=True)
+
+storage = StorageManager(
+    roots=[app.config['UPLOAD_FOLDER'], app.config['RESULTS_FOLDER'],
+           app.config['MODELS_FOLDER'], app.config['CACHE_FOLDER']],
+    blob_root=app.config['UPLOAD_FOLDER'],
+    max_bytes=app.config['STORAGE_MAX_BYTES'],
+    max_age=app.config['STORAGE_MAX_AGE'],
+    min_idle=app.config['STORAGE_MIN_IDLE'],
+    gc_interval=app.config['STORAGE_GC_INTERVAL']
+)
 
 ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def get_workspace():
+    """Идентификатор рабочего пространства текущей сессии"""
+    if 'workspace' not in session:
+        session['workspace'] = uuid.uuid4().hex
+    return session['workspace']
+
+def incremental_state_path(filepath):
+    """Путь к сохраненному CF-дереву BIRCH для файла данных текущей сессии"""
+    digest = hashlib.sha1(os.path.abspath(filepath).encode('utf-8')).hexdigest()
+    return storage.workspace_path(app.config['MODELS_FOLDER'], get_workspace(), f"birch_{digest}.joblib")
+
+def reduction_cache_path(filepath, columns, reduction, dtype):
+    """Путь к кэшу пониженной матрицы для файла данных и набора столбцов"""
+    stat = os.stat(filepath)
+    key = json.dumps([os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size,
+                      columns, reduction, str(dtype)], sort_keys=True)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(app.config['CACHE_FOLDER'], f"reduced_{digest}.joblib")
+
+@app.before_request
+def start_storage_gc():
+    # Garbage collection runs only in processes that serve requests,
+    # not at import time (e.g. in the parent process of the debug reloader)
+    storage.start()
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -41,12 +96,17 @@ def upload_file():
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            # Identical uploads are stored once, keyed by content hash
+            filepath = storage.store_upload(file.stream, filename)
             
             # Store file info in session
             session['filepath'] = filepath
             session['filename'] = filename
+            session.pop('processed_filepath', None)
+            # Results of the previous dataset must not be shown or extended
+            session.pop('clustering_results', None)
+            session.pop('visualization_path', None)
+            session.pop('visualization_3d_path', None)
             
             return redirect(url_for('show_statistics'))
     
@@ -57,6 +117,7 @@ def show_statistics():
     filepath = session.get('filepath')
     if not filepath or not os.path.exists(filepath):
         return redirect(url_for('upload_file'))
+    storage.touch(filepath)
     
     try:
         processor = DataProcessor(filepath)
@@ -75,6 +136,7 @@ def api_statistics():
     filepath = session.get('filepath')
     if not filepath or not os.path.exists(filepath):
         return jsonify({'error': 'Файл не найден'}), 404
+    storage.touch(filepath)
     
     try:
         processor = DataProcessor(filepath)
@@ -95,6 +157,7 @@ def preprocessing():
     filepath = session.get('filepath')
     if not filepath or not os.path.exists(filepath):
         return redirect(url_for('upload_file'))
+    storage.touch(filepath)
     
     processor = DataProcessor(filepath)
     
@@ -112,8 +175,9 @@ def preprocessing():
             
             # Save processed data
             processed_filename = f"processed_{session.get('filename')}"
-            processed_path = os.path.join(app.config['UPLOAD_FOLDER'], processed_filename)
+            processed_path = storage.workspace_path(app.config['UPLOAD_FOLDER'], get_workspace(), processed_filename)
             processor.save_data(processed_path)
+            storage.register(processed_path)
             session['processed_filepath'] = processed_path
             
         elif action == 'remove_outliers':
@@ -121,8 +185,9 @@ def preprocessing():
             processor.remove_outliers(method=method)
             
             processed_filename = f"processed_{session.get('filename')}"
-            processed_path = os.path.join(app.config['UPLOAD_FOLDER'], processed_filename)
+            processed_path = storage.workspace_path(app.config['UPLOAD_FOLDER'], get_workspace(), processed_filename)
             processor.save_data(processed_path)
+            storage.register(processed_path)
             session['processed_filepath'] = processed_path
         
         return redirect(url_for('preprocessing'))
@@ -143,9 +208,9 @@ def clustering():
     filepath = session.get('processed_filepath', session.get('filepath'))
     if not filepath or not os.path.exists(filepath):
         return redirect(url_for('upload_file'))
+    storage.touch(filepath)
     
-    processor = DataProcessor(filepath)
-    columns = processor.data.columns.tolist()
+    columns = DataProcessor.read_columns(filepath)
     
     if request.method == 'POST':
         selected_columns = request.form.getlist('columns')
@@ -158,19 +223,97 @@ def clustering():
                                  error='Выберите хотя бы один столбец для кластеризации')
         
         # Perform clustering
-        clusterer = ClusteringAlgorithms()
-        data_for_clustering = processor.data[selected_columns]
+        clusterer = ClusteringAlgorithms(dtype=app.config['COMPUTE_DTYPE'],
+                                         profile_memory=app.config['PROFILE_MEMORY'])
+        
+        # Read only the selected columns in the compute dtype and build a contiguous matrix
+        # (missing values filled with column means)
+        try:
+            with track_peak_memory(clusterer.memory_profile, 'loading'):
+                processor = DataProcessor(filepath, columns=selected_columns, dtype=clusterer.dtype)
+                matrix = processor.get_feature_matrix(selected_columns, dtype=clusterer.dtype)
+                del processor
+        except ValueError as e:
+            # Text columns cannot be read in the numeric compute dtype
+            return render_template('clustering.html', columns=columns,
+                                 error=f'Выбранные столбцы должны быть числовыми: {e}')
+        
+        reduction = None
+        if request.form.get('reduction') == 'random_projection':
+            # Random projection does not estimate explained variance, so it takes a component count
+            reduction = {
+                'method': 'random_projection',
+                'n_components': request.form.get('reduction_components', 10, type=int)
+            }
+        elif request.form.get('reduction'):
+            reduction = {
+                'method': request.form.get('reduction'),
+                'variance_threshold': request.form.get('variance_threshold', 0.9, type=float)
+            }
         
-        # Handle missing values if any
-        if data_for_clustering.isnull().any().any():
-            data_for_clustering = data_for_clustering.fillna(data_for_clustering.mean())
+        # Keep raw values needed after in-place scaling: preview rows and plot coordinates
+        data_preview = matrix[:5].tolist()
+        plot_data = matrix[:, :2].copy() if matrix.shape[1] >= 2 and not reduction else None
+        
+        params = {}
+        if algorithm == 'birch':
+            params['threshold'] = request.form.get('threshold', 0.5, type=float)
+        
+        # Reduced coordinates are cached per dataset version and column selection
+        cache_path = None
+        if reduction:
+            cache_path = reduction_cache_path(filepath, selected_columns, reduction, clusterer.dtype)
+        
+        # Apply clustering (the matrix is scaled in place)
+        try:
+            results = clusterer.apply_clustering(
+                matrix,
+                algorithm=algorithm,
+                n_clusters=n_clusters,
+                copy=False,
+                reduction=reduction,
+                reduction_cache=cache_path,
+                **params
+            )
+        except ValueError as e:
+            return render_template('clustering.html', columns=columns, error=str(e))
+        
+        data_scaled = matrix
+        if reduction:
+            storage.touch(cache_path)
+            data_scaled = plot_data = results['reduced']
+        
+        stability = None
+        if request.form.get('stability'):
+            # Subsample refits of the same configuration in worker processes
+            stability = clusterer.stability_analysis(
+                data_scaled,
+                algorithm=algorithm,
+                n_clusters=n_clusters,
+                reference_labels=results['labels'],
+                reference_fit_time=results['fit_time'],
+                n_runs=app.config['STABILITY_RUNS'],
+                n_jobs=app.config['PARALLEL_N_JOBS'],
+                time_budget=app.config['STABILITY_TIME_BUDGET'],
+                max_quadratic_rows=app.config['COMPARE_MAX_QUADRATIC_ROWS'],
+                **params
+            )
         
-        # Apply clustering
-        results = clusterer.apply_clustering(
-            data=data_for_clustering,
-            algorithm=algorithm,
-            n_clusters=n_clusters
-        )
+        if algorithm == 'birch':
+            # Persist the CF-tree so that later appends only absorb new rows
+            state_path = incremental_state_path(filepath)
+            IncrementalClustering(state_path).initialize(
+                data_scaled=data_scaled,
+                scaler=clusterer.scaler,
+                columns=selected_columns,
+                model=results['model'],
+                labels=results['labels'],
+                n_clusters=n_clusters,
+                reducer=clusterer.reducer,
+                reducer_components=clusterer.reduction_info['n_components'] if reduction else None,
+                dataset=filepath
+            )
+            storage.register(state_path)
         
         # Store results in session
         session['clustering_results'] = {
@@ -179,32 +322,202 @@ def clustering():
             'columns': selected_columns,
             'labels': results['labels'].tolist(),
             'metrics': results.get('metrics', {}),
-            'data': data_for_clustering.values.tolist()
+            'memory_profile': results.get('memory_profile', {}),
+            'reduction': clusterer.reduction_info if reduction else None,
+            'stability': stability,
+            'data': data_preview
         }
         
         # Generate visualization
         visualizer = Visualizer()
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         viz_filename = f"clustering_{algorithm}_{timestamp}.png"
-        viz_path = os.path.join(app.config['RESULTS_FOLDER'], viz_filename)
+        viz_path = storage.workspace_path(app.config['RESULTS_FOLDER'], get_workspace(), viz_filename)
+        axis_label = 'Компонента' if reduction else 'Признак'
+        session.pop('visualization_path', None)
+        session.pop('visualization_3d_path', None)
         
-        # Select only numeric columns for visualization
-        numeric_cols = data_for_clustering.select_dtypes(include=['float64', 'int64']).columns
-        
-        if len(numeric_cols) >= 2:
-            # Use first two numeric columns for 2D visualization
+        if plot_data is not None and plot_data.shape[1] >= 2:
+            # Reduced coordinates or the first two selected columns for 2D visualization
             visualizer.plot_clusters_2d(
-                data=data_for_clustering[numeric_cols[:2]].values,
+                data=plot_data,
                 labels=results['labels'],
                 algorithm=algorithm,
-                save_path=viz_path
+                save_path=viz_path,
+                axis_label=axis_label
             )
+            storage.register(viz_path)
             session['visualization_path'] = viz_path
         
+        if reduction and plot_data.shape[1] >= 3:
+            viz_3d_path = storage.workspace_path(app.config['RESULTS_FOLDER'], get_workspace(),
+                                                 f"clustering_{algorithm}_3d_{timestamp}.png")
+            visualizer.plot_clusters_3d(
+                data=plot_data,
+                labels=results['labels'],
+                algorithm=algorithm,
+                save_path=viz_3d_path,
+                axis_label=axis_label
+            )
+            storage.register(viz_3d_path)
+            session['visualization_3d_path'] = viz_3d_path
+        
         return redirect(url_for('clustering_results'))
     
     return render_template('clustering.html', columns=columns)
 
+DEFAULT_COMPARE_CONFIGS = [
+    {'algorithm': 'kmeans', 'n_clusters': 3},
+    {'algorithm': 'gmm', 'n_clusters': 3},
+    {'algorithm': 'dbscan', 'eps': 0.5, 'min_samples': 5},
+    {'algorithm': 'birch', 'n_clusters': 3, 'threshold': 0.5}
+]
+
+@app.route('/compare', methods=['GET', 'POST'])
+def compare():
+    filepath = session.get('processed_filepath', session.get('filepath'))
+    if not filepath or not os.path.exists(filepath):
+        return redirect(url_for('upload_file'))
+    storage.touch(filepath)
+    
+    columns = DataProcessor.read_columns(filepath)
+    configs_text = json.dumps(DEFAULT_COMPARE_CONFIGS, indent=2)
+    
+    if request.method == 'POST':
+        selected_columns = request.form.getlist('columns')
+        configs_text = request.form.get('configs', configs_text)
+        
+        if not selected_columns:
+            return render_template('compare.html',
+                                 columns=columns,
+                                 configs_text=configs_text,
+                                 error='Выберите хотя бы один столбец для кластеризации')
+        
+        try:
+            configs = json.loads(configs_text)
+        except ValueError:
+            configs = None
+        
+        if not isinstance(configs, list) or not configs or not all(isinstance(c, dict) for c in configs):
+            return render_template('compare.html',
+                                 columns=columns,
+                                 configs_text=configs_text,
+                                 error='Конфигурации должны быть JSON-списком объектов с ключом algorithm')
+        
+        clusterer = ClusteringAlgorithms(dtype=app.config['COMPUTE_DTYPE'],
+                                         profile_memory=app.config['PROFILE_MEMORY'])
+        
+        # One matrix is prepared and scaled for all configurations
+        try:
+            with track_peak_memory(clusterer.memory_profile, 'loading'):
+                processor = DataProcessor(filepath, columns=selected_columns, dtype=clusterer.dtype)
+                matrix = processor.get_feature_matrix(selected_columns, dtype=clusterer.dtype)
+                del processor
+        except ValueError as e:
+            # Text columns cannot be read in the numeric compute dtype
+            return render_template('compare.html',
+                                 columns=columns,
+                                 configs_text=configs_text,
+                                 error=f'Выбранные столбцы должны быть числовыми: {e}')
+        
+        try:
+            comparison = clusterer.compare_algorithms(
+                data=matrix,
+                configs=configs,
+                n_jobs=app.config['PARALLEL_N_JOBS'],
+                copy=False,
+                max_quadratic_rows=app.config['COMPARE_MAX_QUADRATIC_ROWS']
+            )
+        except ValueError as e:
+            return render_template('compare.html',
+                                 columns=columns,
+                                 configs_text=configs_text,
+                                 error=str(e))
+        
+        return render_template('compare.html',
+                             columns=columns,
+                             selected_columns=selected_columns,
+                             configs_text=configs_text,
+                             comparison=comparison,
+                             memory_profile=clusterer.memory_profile)
+    
+    return render_template('compare.html', columns=columns, configs_text=configs_text)
+
+@app.route('/append', methods=['POST'])
+def append_data():
+    filepath = session.get('processed_filepath', session.get('filepath'))
+    results = session.get('clustering_results')
+    if not filepath or not os.path.exists(filepath) or not results:
+        return redirect(url_for('clustering'))
+    
+    storage.touch(filepath)
+    
+    incremental = IncrementalClustering(incremental_state_path(filepath))
+    if results.get('algorithm') != 'birch' or not incremental.exists():
+        return render_template('results.html', results=results,
+                             visualization_path=session.get('visualization_path'),
+                             error='Инкрементальное дополнение доступно только после кластеризации BIRCH')
+    
+    # Labels are stored per row, so the state is only valid for the file version it was saved with
+    if not incremental.matches_dataset(filepath):
+        return render_template('results.html', results=results,
+                             visualization_path=session.get('visualization_path'),
+                             error='Файл данных изменился после кластеризации BIRCH, выполните кластеризацию заново')
+    
+    file = request.files.get('file')
+    if not file or file.filename == '' or not allowed_file(file.filename):
+        return render_template('results.html', results=results,
+                             visualization_path=session.get('visualization_path'),
+                             error='Файл не выбран')
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    append_path = storage.workspace_path(app.config['UPLOAD_FOLDER'], get_workspace(),
+                                         f"append_{timestamp}_{secure_filename(file.filename)}")
+    file.save(append_path)
+    
+    try:
+        processor = DataProcessor(append_path)
+        columns = incremental.state['columns']
+        missing_columns = [column for column in columns if column not in processor.data.columns]
+        if missing_columns:
+            raise ValueError(f"В файле отсутствуют столбцы: {', '.join(missing_columns)}")
+        
+        # Missing values are filled by the CF-tree with the means of the initial fit
+        matrix = processor.get_feature_matrix(columns, dtype=incremental.state['dtype'], fill_missing=False)
+        
+        # Uploads are shared by content hash, so the session gets its own copy before growing it
+        if not session.get('processed_filepath'):
+            processed_path = storage.workspace_path(app.config['UPLOAD_FOLDER'], get_workspace(),
+                                                    f"processed_{session.get('filename')}")
+            shutil.copyfile(filepath, processed_path)
+            session['processed_filepath'] = filepath = processed_path
+            # The state follows the dataset to its new path
+            previous_state_path = incremental.state_path
+            incremental.state_path = incremental_state_path(filepath)
+            storage.move(previous_state_path, incremental.state_path)
+        
+        # The dataset file grows together with the CF-tree so that saved results stay aligned;
+        # the state records the grown file's version, so a failed append below is detected later
+        append_rows(processor.data, filepath)
+        storage.register(filepath)
+        
+        summary = incremental.append(matrix, dataset=filepath)
+        storage.register(incremental.state_path)
+    except Exception as e:
+        return render_template('results.html', results=results,
+                             visualization_path=session.get('visualization_path'),
+                             error=str(e))
+    finally:
+        os.remove(append_path)
+    
+    results['labels'] = incremental.state['labels'].tolist()
+    results['n_clusters'] = summary['n_clusters']
+    results['metrics'] = {}  # metrics of the initial fit no longer describe the labels
+    results['incremental'] = summary
+    session['clustering_results'] = results
+    
+    return redirect(url_for('clustering_results'))
+
 @app.route('/results')
 def clustering_results():
     results = session.get('clustering_results')
@@ -215,12 +528,14 @@ def clustering_results():
     
     return render_template('results.html', 
                          results=results,
-                         visualization_path=viz_path)
+                         visualization_path=viz_path,
+                         visualization_3d_path=session.get('visualization_3d_path'))
 
 @app.route('/download/<filename>')
 def download_file(filename):
-    filepath = os.path.join(app.config['RESULTS_FOLDER'], filename)
+    filepath = os.path.join(app.config['RESULTS_FOLDER'], get_workspace(), secure_filename(filename))
     if os.path.exists(filepath):
+        storage.touch(filepath)
         return send_file(filepath, as_attachment=True)
     return "File not found", 404
 
@@ -235,10 +550,11 @@ def save_results():
         
         # Save clustering results as CSV
         results_filename = f"clustering_results_{timestamp}.csv"
-        results_path = os.path.join(app.config['RESULTS_FOLDER'], results_filename)
+        results_path = storage.workspace_path(app.config['RESULTS_FOLDER'], get_workspace(), results_filename)
         
         # Create DataFrame with original data and cluster labels
         filepath = session.get('processed_filepath', session.get('filepath'))
+        storage.touch(filepath)
         processor = DataProcessor(filepath)
         
         # Add cluster labels to data
@@ -247,13 +563,15 @@ def save_results():
         
         # Save to CSV
         data_with_clusters.to_csv(results_path, index=False)
+        storage.register(results_path)
         
         # Save metrics as JSON
         metrics_filename = f"clustering_metrics_{timestamp}.json"
-        metrics_path = os.path.join(app.config['RESULTS_FOLDER'], metrics_filename)
+        metrics_path = storage.workspace_path(app.config['RESULTS_FOLDER'], get_workspace(), metrics_filename)
         
         with open(metrics_path, 'w') as f:
             json.dump(results['metrics'], f, indent=2)
+        storage.register(metrics_path)
         
         return jsonify({
             'success': True,
@@ -263,5 +581,9 @@ def save_results():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/storage')
+def api_storage():
+    return jsonify(storage.get_usage())
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
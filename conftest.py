@@ -0,0 +1 @@
+# Корневой conftest добавляет каталог проекта в sys.path, чтобы тесты импортировали пакет src
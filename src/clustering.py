@@ -1,22 +1,156 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import warnings
+from contextlib import contextmanager
 import numpy as np
-from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering, SpectralClustering, MeanShift
+from joblib import Parallel, delayed, dump, load, effective_n_jobs
+from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering, SpectralClustering, MeanShift, Birch
 from sklearn.mixture import GaussianMixture
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
-from sklearn.decomposition import PCA
+from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score, pairwise_distances
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.random_projection import SparseRandomProjection
+
+from src.utils import track_peak_memory
+
+# Алгоритмы с квадратичными по числу строк временем и памятью
+QUADRATIC_ALGORITHMS = ('hierarchical', 'spectral')
+
+def _fit_config(data_scaled, config, dtype):
+    """Обучение одной конфигурации в рабочем процессе"""
+    params = dict(config)
+    algorithm = params.pop('algorithm', 'kmeans')
+    n_clusters = params.pop('n_clusters', 3)
+    
+    start = time.perf_counter()
+    try:
+        labels = ClusteringAlgorithms(dtype)._fit_model(data_scaled, algorithm, n_clusters, {},
+                                                        probabilities=False, **params)
+    except Exception as e:
+        return None, None, str(e)
+    
+    return labels, round(time.perf_counter() - start, 4), None
+
+def _fit_subsample(data_scaled, indices, config, dtype):
+    """Обучение конфигурации на подвыборке строк в рабочем процессе"""
+    labels, _, error = _fit_config(data_scaled[indices], config, dtype)
+    return indices, labels, error
+
+def _match_labels(reference, labels):
+    """ARI и кластерные индексы Жаккара по таблице сопряженности двух разбиений
+    
+    Шум DBSCAN (-1) не считается кластером: в ARI каждая точка шума - отдельный
+    одноточечный кластер, а в индексе Жаккара шум не подбирается в пару кластеру.
+    """
+    reference_ids, reference = np.unique(reference, return_inverse=True)
+    label_ids, labels = np.unique(labels, return_inverse=True)
+    n_reference, n_labels = len(reference_ids), len(label_ids)
+    
+    contingency = np.bincount(reference * n_labels + labels,
+                              minlength=n_reference * n_labels).reshape(n_reference, n_labels)
+    reference_sizes = contingency.sum(axis=1)
+    label_sizes = contingency.sum(axis=0)
+    
+    # Adjusted Rand Index через число пар объектов, совпадающих по назначению
+    # (одноточечные кластеры шума пар не образуют)
+    reference_clustered, labels_clustered = reference_ids != -1, label_ids != -1
+    clustered = contingency[reference_clustered][:, labels_clustered]
+    pairs = (clustered * (clustered - 1)).sum() / 2
+    reference_pairs = (reference_sizes[reference_clustered] * (reference_sizes[reference_clustered] - 1)).sum() / 2
+    label_pairs = (label_sizes[labels_clustered] * (label_sizes[labels_clustered] - 1)).sum() / 2
+    expected = reference_pairs * label_pairs / (len(reference) * (len(reference) - 1) / 2)
+    denominator = (reference_pairs + label_pairs) / 2 - expected
+    ari = 1.0 if denominator == 0 else (pairs - expected) / denominator
+    
+    # Лучшее совпадение каждого исходного кластера с кластерами повторного обучения
+    jaccard = contingency / (reference_sizes[:, None] + label_sizes[None, :] - contingency)
+    jaccard[:, ~labels_clustered] = 0
+    return ari, jaccard.max(axis=1)
+
+@contextmanager
+def _shared_memmap(data):
+    """Выкладывание матрицы в memmap, разделяемый рабочими процессами"""
+    temp_folder = tempfile.mkdtemp(prefix='clustering_shared_')
+    try:
+        matrix_path = os.path.join(temp_folder, 'matrix.joblib')
+        dump(data, matrix_path)
+        yield load(matrix_path, mmap_mode='r')
+    finally:
+        shutil.rmtree(temp_folder, ignore_errors=True)
 
 class ClusteringAlgorithms:
-    def __init__(self):
-        self.scaler = StandardScaler()
+    def __init__(self, dtype=np.float64, profile_memory=False):
+        self.dtype = np.dtype(dtype)
+        self.scaler = StandardScaler(copy=False)
+        # Пиковая память по этапам (МБ), None - замер отключен
+        self.memory_profile = {} if profile_memory else None
+        # Модель и сведения последнего понижения размерности
+        self.reducer = None
+        self.reduction_info = None
     
-    def apply_clustering(self, data, algorithm='kmeans', n_clusters=3, **kwargs):
+    def prepare_data(self, data, copy=True):
+        """Приведение данных к C-непрерывной матрице вычислительного типа и масштабирование на месте"""
+        with track_peak_memory(self.memory_profile, 'scaling'):
+            if copy or not isinstance(data, np.ndarray):
+                matrix = np.array(data, dtype=self.dtype, order='C')
+            else:
+                matrix = np.ascontiguousarray(data, dtype=self.dtype)
+            
+            self.scaler.fit_transform(matrix)
+        
+        return matrix
+    
+    def apply_clustering(self, data, algorithm='kmeans', n_clusters=3, copy=True, reduction=None,
+                         reduction_cache=None, **kwargs):
         """Применение алгоритма кластеризации"""
         
-        # Масштабирование данных
-        data_scaled = self.scaler.fit_transform(data)
+        # Масштабирование данных (при copy=False массив нужного типа масштабируется на месте)
+        data_scaled = self.prepare_data(data, copy=copy)
+        
+        # Необязательное понижение размерности, reduction - параметры reduce_dimensionality,
+        # reduction_cache - путь к файлу кэша пониженной матрицы
+        if reduction:
+            data_scaled = self._reduce_cached(data_scaled, reduction, reduction_cache)
+        
+        results = self.cluster_scaled(data_scaled, algorithm, n_clusters, **kwargs)
+        
+        if reduction:
+            results['reduced'] = data_scaled
+            results['reduction'] = dict(self.reduction_info)
+        
+        return results
+    
+    def cluster_scaled(self, data_scaled, algorithm='kmeans', n_clusters=3, **kwargs):
+        """Кластеризация уже подготовленной матрицы"""
         
         results = {}
         
+        start = time.perf_counter()
+        with track_peak_memory(self.memory_profile, 'fitting'):
+            labels = self._fit_model(data_scaled, algorithm, n_clusters, results, **kwargs)
+        
+        results['fit_time'] = round(time.perf_counter() - start, 4)
+        results['labels'] = labels
+        results['n_clusters'] = len(np.unique(labels[labels != -1]))  # исключаем шум для DBSCAN
+        
+        # Вычисление метрик качества кластеризации
+        if len(np.unique(labels)) > 1:
+            try:
+                with track_peak_memory(self.memory_profile, 'metrics'):
+                    results['metrics'] = self.calculate_metrics(data_scaled, labels)
+            except:
+                results['metrics'] = {}
+        
+        if self.memory_profile is not None:
+            results['memory_profile'] = dict(self.memory_profile)
+        
+        return results
+    
+    def _fit_model(self, data_scaled, algorithm, n_clusters, results, probabilities=True, **kwargs):
+        """Обучение модели и заполнение results атрибутами модели (probabilities - вероятности GMM)"""
         if algorithm == 'kmeans':
             model = KMeans(n_clusters=n_clusters, random_state=42, **kwargs)
             labels = model.fit_predict(data_scaled)
@@ -40,45 +174,209 @@ class ClusteringAlgorithms:
             model = GaussianMixture(n_components=n_clusters, random_state=42, **kwargs)
             labels = model.fit_predict(data_scaled)
             results['model'] = model
-            results['probabilities'] = model.predict_proba(data_scaled)
+            if probabilities:
+                results['probabilities'] = model.predict_proba(data_scaled)
         
         elif algorithm == 'spectral':
             model = SpectralClustering(n_clusters=n_clusters, random_state=42, **kwargs)
             labels = model.fit_predict(data_scaled)
             results['model'] = model
         
+        elif algorithm == 'birch':
+            threshold = kwargs.get('threshold', 0.5)
+            branching_factor = kwargs.get('branching_factor', 50)
+            model = Birch(n_clusters=n_clusters, threshold=threshold, branching_factor=branching_factor)
+            labels = model.fit_predict(data_scaled)
+            results['model'] = model
+        
         else:
             raise ValueError(f"Алгоритм {algorithm} не поддерживается")
         
-        results['labels'] = labels
-        results['n_clusters'] = len(np.unique(labels[labels != -1]))  # исключаем шум для DBSCAN
+        return labels
+    
+    def compare_algorithms(self, data, configs, n_jobs=-1, silhouette_sample=3000, copy=True,
+                           max_quadratic_rows=10000):
+        """Сравнение нескольких конфигураций на одной подготовленной матрице"""
+        data_scaled = self.prepare_data(data, copy=copy)
         
-        # Вычисление метрик качества кластеризации
-        if len(np.unique(labels)) > 1:
-            try:
-                results['metrics'] = self.calculate_metrics(data_scaled, labels)
-            except:
-                results['metrics'] = {}
+        # Квадратичные алгоритмы на больших матрицах не запускаются вовсе
+        n_samples = data_scaled.shape[0]
+        refused = [max_quadratic_rows is not None and n_samples > max_quadratic_rows and
+                   config.get('algorithm', 'kmeans') in QUADRATIC_ALGORITHMS for config in configs]
         
-        return results
+        # Матрица выкладывается в memmap один раз и разделяется всеми рабочими процессами
+        with _shared_memmap(data_scaled) as shared:
+            fitted = iter(Parallel(n_jobs=n_jobs)(
+                delayed(_fit_config)(shared, config, self.dtype)
+                for config, skip in zip(configs, refused) if not skip
+            ))
+            fitted = [
+                (None, None, f"Алгоритм требует O(n²) памяти: {n_samples} строк при пределе {max_quadratic_rows}")
+                if skip else next(fitted)
+                for skip in refused
+            ]
+            
+            # Общая матрица расстояний по подвыборке для silhouette всех конфигураций
+            with track_peak_memory(self.memory_profile, 'metrics'):
+                rng = np.random.RandomState(42)
+                sample_indices = np.sort(rng.choice(n_samples, min(silhouette_sample, n_samples), replace=False))
+                distances = pairwise_distances(shared[sample_indices])
+                
+                comparison = []
+                for config, (labels, fit_time, error) in zip(configs, fitted):
+                    row = {
+                        'algorithm': config.get('algorithm', 'kmeans'),
+                        'params': {k: v for k, v in config.items() if k != 'algorithm'},
+                        'fit_time': fit_time,
+                        'error': error
+                    }
+                    
+                    if labels is not None:
+                        cluster_ids, counts = np.unique(labels, return_counts=True)
+                        row['n_clusters'] = int(np.sum(cluster_ids != -1))  # исключаем шум для DBSCAN
+                        row['cluster_sizes'] = {str(c): int(n) for c, n in zip(cluster_ids, counts)}
+                        row['metrics'] = self.calculate_metrics(shared, labels, distances, sample_indices)
+                    
+                    comparison.append(row)
+        
+        return comparison
     
-    def calculate_metrics(self, data, labels):
+    def stability_analysis(self, data_scaled, algorithm='kmeans', n_clusters=3, reference_labels=None,
+                           n_runs=50, subsample=0.8, n_jobs=-1, tol=0.01, min_runs=10,
+                           time_budget=None, reference_fit_time=None, max_quadratic_rows=None, **kwargs):
+        """Оценка устойчивости кластеризации повторным обучением на подвыборках"""
+        start = time.perf_counter()
+        config = dict(kwargs, algorithm=algorithm, n_clusters=n_clusters)
+        
+        if reference_labels is None:
+            reference_labels = self._fit_model(data_scaled, algorithm, n_clusters, {},
+                                               probabilities=False, **kwargs)
+            reference_fit_time = time.perf_counter() - start
+        reference_labels = np.asarray(reference_labels)
+        
+        clusters = np.unique(reference_labels)
+        if np.count_nonzero(clusters != -1) < 2:
+            # Без двух настоящих кластеров (например, все строки - шум DBSCAN) ARI не информативен
+            return {
+                'mean_ari': None,
+                'std_ari': None,
+                'n_runs': 0,
+                'converged': False,
+                'elapsed': round(time.perf_counter() - start, 4),
+                'cluster_stability': {},
+                'degenerate': True
+            }
+        
+        n_samples = data_scaled.shape[0]
+        if algorithm in QUADRATIC_ALGORITHMS and max_quadratic_rows is not None and n_samples > max_quadratic_rows:
+            # Квадратичные по памяти обучения выполняются по одному, как опорное обучение
+            n_jobs = 1
+        
+        # Длительность одного обучения оценивается по опорному обучению на всей матрице
+        run_time = reference_fit_time * subsample if reference_fit_time is not None else 0.0
+        deadline = start + time_budget if time_budget is not None else None
+        
+        subsample_size = max(int(n_samples * subsample), 2)
+        rng = np.random.RandomState(42)
+        
+        scores, jaccard_runs, errors = [], [], []
+        converged = False
+        
+        with _shared_memmap(data_scaled) as shared:
+            batch_size = effective_n_jobs(n_jobs)
+            timed_out = False
+            
+            while len(scores) + len(errors) < n_runs and not timed_out:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.perf_counter()
+                    # Партия не запускается, если по оценке не успеет ни одно обучение
+                    if timeout <= run_time:
+                        break
+                
+                batch = min(batch_size, n_runs - len(scores) - len(errors))
+                subsamples = [np.sort(rng.choice(n_samples, subsample_size, replace=False)) for _ in range(batch)]
+                
+                # Результаты забираются по мере готовности; по истечении бюджета оставшиеся
+                # обучения прерываются вместе с рабочими процессами
+                fitted = Parallel(n_jobs=n_jobs, return_as='generator',
+                                  timeout=timeout if batch_size > 1 else None)(
+                    delayed(_fit_subsample)(shared, indices, config, self.dtype) for indices in subsamples
+                )
+                try:
+                    for indices, labels, error in fitted:
+                        if error is not None:
+                            errors.append(error)
+                        else:
+                            ari, jaccard = _match_labels(reference_labels[indices], labels)
+                            scores.append(ari)
+                            
+                            # Кластеры, не попавшие в подвыборку, не учитываются в этом прогоне
+                            run_jaccard = np.full(len(clusters), np.nan)
+                            run_jaccard[np.isin(clusters, reference_labels[indices])] = jaccard
+                            jaccard_runs.append(run_jaccard)
+                        
+                        # Последовательное выполнение (n_jobs=1) проверяет бюджет между обучениями
+                        if deadline is not None and time.perf_counter() > deadline:
+                            timed_out = True
+                            break
+                except multiprocessing.TimeoutError:
+                    timed_out = True
+                finally:
+                    fitted.close()
+                
+                # Ранняя остановка, когда стандартная ошибка среднего ARI ниже допуска
+                if len(scores) >= min_runs and np.std(scores, ddof=1) / np.sqrt(len(scores)) < tol:
+                    converged = True
+                    break
+        
+        if errors and not scores:
+            raise ValueError(errors[0])
+        
+        stability = {
+            'mean_ari': None,
+            'std_ari': None,
+            'n_runs': len(scores),
+            'converged': converged,
+            'elapsed': round(time.perf_counter() - start, 4),
+            'cluster_stability': {},
+            'degenerate': False
+        }
+        
+        # При исчерпании бюджета до первого прогона возвращаются пустые оценки
+        if scores:
+            cluster_scores = np.nanmean(np.vstack(jaccard_runs), axis=0)
+            stability['mean_ari'] = round(float(np.mean(scores)), 4)
+            stability['std_ari'] = round(float(np.std(scores)), 4)
+            # Шум DBSCAN не является кластером и не оценивается
+            stability['cluster_stability'] = {
+                str(c): round(float(v), 4) for c, v in zip(clusters, cluster_scores) if c != -1
+            }
+        
+        return stability
+    
+    def calculate_metrics(self, data, labels, distances=None, sample_indices=None):
         """Вычисление метрик качества кластеризации"""
         metrics = {}
         
         if len(np.unique(labels)) > 1:
             try:
-                metrics['silhouette_score'] = round(silhouette_score(data, labels), 4)
+                if distances is not None:
+                    # Silhouette по заранее посчитанным расстояниям подвыборки
+                    score = silhouette_score(distances, labels[sample_indices], metric='precomputed')
+                else:
+                    score = silhouette_score(data, labels)
+                metrics['silhouette_score'] = round(float(score), 4)
             except:
                 metrics['silhouette_score'] = None
             
             try:
-                metrics['calinski_harabasz_score'] = round(calinski_harabasz_score(data, labels), 4)
+                metrics['calinski_harabasz_score'] = round(float(calinski_harabasz_score(data, labels)), 4)
             except:
                 metrics['calinski_harabasz_score'] = None
             
             try:
-                metrics['davies_bouldin_score'] = round(davies_bouldin_score(data, labels), 4)
+                metrics['davies_bouldin_score'] = round(float(davies_bouldin_score(data, labels)), 4)
             except:
                 metrics['davies_bouldin_score'] = None
         
@@ -86,12 +384,12 @@ class ClusteringAlgorithms:
     
     def find_optimal_clusters(self, data, algorithm='kmeans', max_clusters=10):
         """Поиск оптимального количества кластеров"""
-        data_scaled = self.scaler.fit_transform(data)
+        data_scaled = self.prepare_data(data)
         scores = []
         
         for n in range(2, max_clusters + 1):
             try:
-                results = self.apply_clustering(data, algorithm, n_clusters=n)
+                results = self.cluster_scaled(data_scaled, algorithm, n_clusters=n)
                 if 'metrics' in results and results['metrics'].get('silhouette_score'):
                     scores.append({
                         'n_clusters': n,
@@ -104,7 +402,85 @@ class ClusteringAlgorithms:
         
         return scores
     
-    def reduce_dimensionality(self, data, n_components=2):
+    def reduce_dimensionality(self, data, n_components=2, method='pca', variance_threshold=None,
+                              max_components=None, batch_size=None):
         """Уменьшение размерности данных"""
-        pca = PCA(n_components=n_components)
-        return pca.fit_transform(data)
\ No newline at end of file
+        data = np.asarray(data)
+        n_samples, n_features = data.shape
+        limit = min(max_components or n_features, n_samples, n_features)
+        
+        if method == 'random_projection':
+            # Случайная проекция не оценивает объясненную дисперсию
+            if variance_threshold is not None:
+                raise ValueError("Для случайной проекции задайте число компонент, а не долю дисперсии")
+            if n_components >= n_features:
+                raise ValueError(f"Проекция в {n_components} компонент не понижает размерность "
+                                 f"{n_features} признаков")
+        elif method not in ('pca', 'incremental_pca'):
+            raise ValueError(f"Метод понижения размерности {method} не поддерживается")
+        
+        # При заданном пороге объясненной дисперсии PCA обучается на 50 компонентах с удвоением
+        # до достижения порога, IncrementalPCA - сразу на всех (каждое обучение - полный проход)
+        if variance_threshold is None:
+            n_fitted = min(n_components, limit)
+        elif method == 'pca':
+            n_fitted = min(50, limit)
+        else:
+            n_fitted = limit
+        
+        start = time.perf_counter()
+        with track_peak_memory(self.memory_profile, 'reduction'):
+            while True:
+                if method == 'pca':
+                    model = PCA(n_components=n_fitted, svd_solver='randomized', random_state=42)
+                elif method == 'incremental_pca':
+                    model = IncrementalPCA(n_components=n_fitted,
+                                           batch_size=max(batch_size or 5 * n_features, n_fitted))
+                else:
+                    model = SparseRandomProjection(n_components=n_components, dense_output=True, random_state=42)
+                model.fit(data)
+                
+                if method != 'pca' or variance_threshold is None or n_fitted == limit or \
+                   model.explained_variance_ratio_.sum() >= variance_threshold:
+                    break
+                n_fitted = min(2 * n_fitted, limit)
+            
+            explained_variance, threshold_reached = None, None
+            if method != 'random_projection':
+                cumulative = np.cumsum(model.explained_variance_ratio_)
+                n_components = n_fitted
+                if variance_threshold is not None:
+                    # Обученная модель не изменяется: лишние компоненты отбрасываются из результата
+                    n_components = min(int(np.searchsorted(cumulative, variance_threshold) + 1), n_fitted)
+                    threshold_reached = bool(cumulative[n_components - 1] >= variance_threshold)
+                    if not threshold_reached:
+                        warnings.warn(f"Доля объясненной дисперсии {variance_threshold} не достигнута: "
+                                      f"{n_components} компонент объясняют {cumulative[-1]:.4f}")
+                explained_variance = round(float(cumulative[n_components - 1]), 4)
+            
+            reduced = np.ascontiguousarray(model.transform(data)[:, :n_components], dtype=self.dtype)
+        
+        self.reducer = model
+        self.reduction_info = {
+            'method': method,
+            'n_features': int(n_features),
+            'n_components': int(n_components),
+            'explained_variance': explained_variance,
+            'threshold_reached': threshold_reached,
+            'fit_time': round(time.perf_counter() - start, 4)
+        }
+        
+        return reduced
+    
+    def _reduce_cached(self, data_scaled, reduction, cache_path=None):
+        """Понижение размерности с сохранением результата в кэш cache_path"""
+        if cache_path is not None and os.path.exists(cache_path):
+            self.reducer, reduced, self.reduction_info = load(cache_path)
+            self.reduction_info['cached'] = True
+            return reduced
+        
+        reduced = self.reduce_dimensionality(data_scaled, **reduction)
+        if cache_path is not None:
+            dump((self.reducer, reduced, self.reduction_info), cache_path)
+        self.reduction_info['cached'] = False
+        return reduced
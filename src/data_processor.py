@@ -5,16 +5,26 @@ from scipy import stats
 import json
 
 class DataProcessor:
-    def __init__(self, filepath):
+    def __init__(self, filepath, columns=None, dtype=None):
         self.filepath = filepath
-        self.load_data()
+        self.load_data(columns, dtype)
     
-    def load_data(self):
-        """Загрузка данных из файла"""
+    def load_data(self, columns=None, dtype=None):
+        """Загрузка данных из файла (только столбцов columns в типе dtype, если заданы)"""
         if self.filepath.endswith('.csv'):
-            self.data = pd.read_csv(self.filepath, encoding='utf-8')
+            self.data = pd.read_csv(self.filepath, encoding='utf-8', usecols=columns, dtype=dtype)
         elif self.filepath.endswith('.xlsx'):
-            self.data = pd.read_excel(self.filepath)
+            self.data = pd.read_excel(self.filepath, usecols=columns, dtype=dtype)
+        else:
+            raise ValueError("Неподдерживаемый формат файла")
+    
+    @staticmethod
+    def read_columns(filepath):
+        """Список столбцов файла без чтения данных"""
+        if filepath.endswith('.csv'):
+            return pd.read_csv(filepath, encoding='utf-8', nrows=0).columns.tolist()
+        elif filepath.endswith('.xlsx'):
+            return pd.read_excel(filepath, nrows=0).columns.tolist()
         else:
             raise ValueError("Неподдерживаемый формат файла")
     
@@ -138,6 +148,21 @@ class DataProcessor:
                 z_scores = np.abs(stats.zscore(col_data.fillna(col_data.mean())))
                 self.data = self.data[z_scores <= 3]
     
+    def get_feature_matrix(self, columns, dtype=np.float32, fill_missing=True):
+        """Построение C-непрерывной матрицы признаков с заполнением пропусков средним (или NaN)"""
+        matrix = np.empty((len(self.data), len(columns)), dtype=dtype, order='C')
+        
+        # Копируем по столбцам сразу в целевой тип, без промежуточных DataFrame
+        for j, column in enumerate(columns):
+            target = matrix[:, j]
+            target[:] = self.data[column].to_numpy(dtype=dtype, na_value=np.nan)
+            
+            missing = np.isnan(target)
+            if fill_missing and missing.any():
+                target[missing] = np.nanmean(target, dtype=np.float64)
+        
+        return matrix
+    
     def save_data(self, filepath):
         """Сохранение обработанных данных"""
         if filepath.endswith('.csv'):
@@ -0,0 +1,195 @@
+import os
+import time
+import numpy as np
+from joblib import dump, load
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import AgglomerativeClustering
+from sklearn.metrics import pairwise_distances_argmin
+
+class IncrementalClustering:
+    """Сохраняемое CF-дерево BIRCH для датасетов, пополняемых добавлением строк"""
+    
+    def __init__(self, state_path):
+        self.state_path = state_path
+        self.state = None
+        
+        if os.path.exists(state_path):
+            self.state = load(state_path)
+            self._link_leaves(self.state.pop('leaves'))
+            self._restore_views()
+    
+    def exists(self):
+        return self.state is not None
+    
+    def initialize(self, data_scaled, scaler, columns, model, labels, n_clusters, reducer=None,
+                   reducer_components=None, dataset=None):
+        """Создание состояния по результату первичной кластеризации birch (dataset - файл данных)"""
+        # Глобальная кластеризация дальше выполняется отдельно по листовым подкластерам
+        model.set_params(n_clusters=None, compute_labels=False)
+        
+        self.state = {
+            'columns': list(columns),
+            'dtype': data_scaled.dtype,
+            'scaler': scaler,
+            'reducer': reducer,
+            'reducer_components': reducer_components,  # первые компоненты результата reducer
+            'model': model,
+            'n_clusters': n_clusters,
+            'row_subclusters': pairwise_distances_argmin(data_scaled, model.subcluster_centers_).astype(np.int32),
+            'subcluster_labels': np.asarray(model.subcluster_labels_, dtype=np.int32),
+            'labels': np.asarray(labels, dtype=np.int32),
+            'dataset': self._dataset_version(dataset)
+        }
+        self.save()
+    
+    def matches_dataset(self, dataset):
+        """Проверка, что файл данных не менялся с последнего сохранения состояния"""
+        return self.state is not None and self.state.get('dataset') == self._dataset_version(dataset)
+    
+    def append(self, data, dataset=None):
+        """Добавление новых строк в CF-дерево и обновление меток затронутых строк
+        
+        dataset - файл данных, уже пополненный этими строками: его версия запоминается
+        для проверки matches_dataset при следующем добавлении.
+        """
+        if self.state is None:
+            raise ValueError("Состояние инкрементальной кластеризации не найдено")
+        
+        start = time.perf_counter()
+        state = self.state
+        model = state['model']
+        
+        # Новые строки масштабируются параметрами первичного обучения (на месте)
+        matrix = np.ascontiguousarray(data, dtype=state['dtype'])
+        # Пропуски заполняются средними первичного обучения (после масштабирования - нулем),
+        # а не средними добавляемой партии
+        missing = np.isnan(matrix)
+        if missing.any():
+            matrix[missing] = np.broadcast_to(state['scaler'].mean_, matrix.shape)[missing]
+        state['scaler'].transform(matrix)
+        if state.get('reducer') is not None:
+            reduced = state['reducer'].transform(matrix)[:, :state.get('reducer_components')]
+            matrix = np.ascontiguousarray(reduced, dtype=state['dtype'])
+        
+        # Листовые подкластеры BIRCH не удаляются, а только пополняются и переносятся
+        # между узлами, поэтому старые индексы переводятся в новые по идентичности объектов
+        before = self._leaf_subclusters()
+        model.partial_fit(matrix)
+        after = self._leaf_subclusters()
+        
+        position = {id(subcluster): i for i, subcluster in enumerate(after)}
+        remap = np.array([position[id(subcluster)] for subcluster in before], dtype=np.int32)
+        row_subclusters = remap[state['row_subclusters']]
+        
+        centers = model.subcluster_centers_
+        new_subclusters = pairwise_distances_argmin(matrix, centers).astype(np.int32)
+        
+        previous_labels = np.full(len(after), -1, dtype=np.int32)
+        previous_labels[remap] = state['subcluster_labels']
+        subcluster_labels = self._global_clustering(centers, previous_labels, state['n_clusters'])
+        
+        # Метки пересчитываются только для строк из подкластеров, сменивших кластер
+        changed = previous_labels != subcluster_labels
+        affected = changed[row_subclusters]
+        labels = state['labels']
+        labels[affected] = subcluster_labels[row_subclusters[affected]]
+        
+        state['labels'] = np.concatenate([labels, subcluster_labels[new_subclusters]])
+        state['row_subclusters'] = np.concatenate([row_subclusters, new_subclusters])
+        state['subcluster_labels'] = subcluster_labels
+        if dataset is not None:
+            state['dataset'] = self._dataset_version(dataset)
+        self.save()
+        
+        return {
+            'n_new_rows': int(len(matrix)),
+            'n_affected_rows': int(affected.sum()),
+            'n_subclusters': int(len(centers)),
+            'n_clusters': int(len(np.unique(subcluster_labels))),
+            'append_time': round(time.perf_counter() - start, 4)
+        }
+    
+    def save(self):
+        """Сохранение состояния на диск"""
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        
+        # Цепочка листьев next_leaf_/prev_leaf_ сохраняется списком: рекурсивный
+        # pickle длинного связного списка упирается в предел глубины рекурсии
+        leaves = self._leaves()
+        for leaf in leaves:
+            leaf.prev_leaf_ = leaf.next_leaf_ = None
+        self.state['model'].dummy_leaf_.next_leaf_ = None
+        
+        try:
+            dump(dict(self.state, leaves=leaves), self.state_path)
+        finally:
+            self._link_leaves(leaves)
+    
+    @staticmethod
+    def _dataset_version(dataset):
+        """Размер и время изменения файла данных вместо повторного чтения его строк"""
+        if dataset is None:
+            return None
+        stat = os.stat(dataset)
+        return stat.st_size, stat.st_mtime_ns
+    
+    def _leaves(self):
+        """Листья CF-дерева в порядке обхода BIRCH"""
+        leaves = []
+        leaf = self.state['model'].dummy_leaf_.next_leaf_
+        while leaf is not None:
+            leaves.append(leaf)
+            leaf = leaf.next_leaf_
+        return leaves
+    
+    def _link_leaves(self, leaves):
+        """Восстановление цепочки листьев после загрузки"""
+        previous = self.state['model'].dummy_leaf_
+        for leaf in leaves:
+            previous.next_leaf_ = leaf
+            leaf.prev_leaf_ = previous
+            previous = leaf
+        previous.next_leaf_ = None
+    
+    def _restore_views(self):
+        """Восстановление centroids_ и squared_norm_ узлов как представлений init_-массивов"""
+        # Birch пишет обновления в init_centroids_/init_sq_norm_, а расстояния считает по их
+        # представлениям; после pickle представления становятся независимыми копиями
+        nodes = [self.state['model'].root_]
+        while nodes:
+            node = nodes.pop()
+            n_subclusters = len(node.subclusters_)
+            node.centroids_ = node.init_centroids_[:n_subclusters, :]
+            node.squared_norm_ = node.init_sq_norm_[:n_subclusters]
+            nodes.extend(subcluster.child_ for subcluster in node.subclusters_
+                         if subcluster.child_ is not None)
+    
+    def _leaf_subclusters(self):
+        """Листовые подкластеры в порядке строк subcluster_centers_"""
+        return [subcluster for leaf in self._leaves() for subcluster in leaf.subclusters_]
+    
+    def _global_clustering(self, centers, previous_labels, n_clusters):
+        """Глобальные кластеры по центрам подкластеров с сохранением прежних номеров"""
+        if n_clusters is None:
+            # Без глобального этапа каждый подкластер - отдельный кластер, как в Birch
+            return np.arange(len(centers), dtype=np.int32)
+        
+        n_clusters = min(n_clusters, len(centers))
+        if n_clusters < 2:
+            return np.zeros(len(centers), dtype=np.int32)
+        
+        labels = AgglomerativeClustering(n_clusters=n_clusters).fit_predict(centers)
+        
+        # Сопоставление новых кластеров прежним по числу общих подкластеров
+        known = previous_labels >= 0
+        n_previous = previous_labels[known].max() + 1 if known.any() else 0
+        contingency = np.zeros((n_clusters, max(n_previous, 1)), dtype=np.int64)
+        np.add.at(contingency, (labels[known], previous_labels[known]), 1)
+        rows, cols = linear_sum_assignment(-contingency)
+        
+        mapping = np.full(n_clusters, -1, dtype=np.int32)
+        mapping[rows] = cols
+        unmatched = mapping == -1
+        mapping[unmatched] = np.arange(unmatched.sum()) + max(n_previous, cols.max() + 1)
+        
+        return mapping[labels]
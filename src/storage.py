@@ -0,0 +1,244 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+class StorageManager:
+    """Файловое хранилище с рабочими пространствами сессий, дедупликацией загрузок и сборкой мусора"""
+    
+    def __init__(self, roots, blob_root, max_bytes=None, max_age=None, min_idle=600, gc_interval=300):
+        self.roots = [os.path.abspath(root) for root in roots]
+        # Загрузки хранятся по хэшу содержимого с разбиением на подкаталоги по первым символам
+        self.blob_root = os.path.join(os.path.abspath(blob_root), 'objects')
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_idle = min_idle
+        self.gc_interval = gc_interval
+        
+        self._lock = threading.Lock()
+        # Время обращения хранится и на диске (atime), поэтому видно всем процессам приложения
+        self._index = {}  # путь -> [размер, время последнего обращения]
+        self._stats = {
+            'dedup_hits': 0,
+            'dedup_bytes_saved': 0,
+            'evicted_files': 0,
+            'evicted_bytes': 0,
+            'gc_runs': 0,
+            'last_gc': None
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        
+        for root in self.roots:
+            os.makedirs(root, exist_ok=True)
+        self._scan()
+    
+    def start(self):
+        """Запуск фоновой сборки мусора (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='storage-gc', daemon=True)
+                self._thread.start()
+    
+    def stop(self):
+        """Остановка фоновой сборки мусора"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def workspace_path(self, root, workspace, filename):
+        """Путь к файлу в рабочем пространстве сессии"""
+        directory = os.path.join(root, workspace)
+        os.makedirs(directory, exist_ok=True)
+        # Свежее время изменения защищает каталог от удаления сборщиком до записи файла
+        os.utime(directory)
+        return os.path.join(directory, filename)
+    
+    def store_upload(self, stream, filename):
+        """Сохранение загрузки с дедупликацией по SHA-256 содержимого"""
+        os.makedirs(self.blob_root, exist_ok=True)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_root, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+            
+            content_hash = digest.hexdigest()
+            blob_path = os.path.join(self.blob_root, content_hash[:2], content_hash + extension)
+            
+            # Проверка и перенос под блокировкой, чтобы сборщик не удалил найденный дубликат
+            with self._lock:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                if os.path.exists(blob_path):
+                    self._stats['dedup_hits'] += 1
+                    self._stats['dedup_bytes_saved'] += os.path.getsize(temp_path)
+                    os.remove(temp_path)
+                    self._mark_access(blob_path)
+                else:
+                    os.replace(temp_path, blob_path)
+                self._index[os.path.abspath(blob_path)] = [os.path.getsize(blob_path), time.time()]
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        return blob_path
+    
+    def register(self, path):
+        """Учет созданного или измененного файла"""
+        size = os.path.getsize(path)
+        with self._lock:
+            self._index[os.path.abspath(path)] = [size, time.time()]
+    
+    def move(self, source, destination):
+        """Перемещение файла с переносом его учета в индексе"""
+        os.replace(source, destination)
+        with self._lock:
+            self._index.pop(os.path.abspath(source), None)
+        self.register(destination)
+    
+    def touch(self, path):
+        """Отметка обращения к файлу для вытеснения по давности использования"""
+        path = os.path.abspath(path)
+        with self._lock:
+            try:
+                now = self._mark_access(path)
+            except FileNotFoundError:
+                return
+            if path in self._index:
+                self._index[path][1] = now
+                return
+        self.register(path)
+    
+    def collect_garbage(self):
+        """Удаление устаревших файлов и вытеснение давно не использованных при превышении квоты"""
+        # Индекс перечитывается с диска: файлы и обращения других процессов учитываются тоже
+        self._scan()
+        now = time.time()
+        with self._lock:
+            entries = sorted(self._index.items(), key=lambda entry: entry[1][1])
+            total = sum(size for size, _ in self._index.values())
+        
+        # Кандидаты отбираются от давно не использованных к недавним
+        candidates = []
+        for path, (size, last_access) in entries:
+            idle = now - last_access
+            if idle < self.min_idle:
+                continue
+            if (self.max_age is not None and idle > self.max_age) or \
+               (self.max_bytes is not None and total > self.max_bytes):
+                candidates.append((path, last_access))
+                total -= size
+        
+        evicted_files, evicted_bytes = 0, 0
+        for path, last_access in candidates:
+            # Блокировка держится только на время удаления одного файла
+            with self._lock:
+                entry = self._index.get(path)
+                if entry is None or entry[1] != last_access:
+                    continue  # к файлу обратились после отбора
+                try:
+                    # Обращение из другого процесса видно только по времени на диске
+                    disk_access = self._last_access(os.stat(path))
+                    if disk_access > last_access:
+                        entry[1] = disk_access
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                del self._index[path]
+            evicted_files += 1
+            evicted_bytes += entry[0]
+        
+        self._remove_empty_directories()
+        
+        with self._lock:
+            self._stats['evicted_files'] += evicted_files
+            self._stats['evicted_bytes'] += evicted_bytes
+            self._stats['gc_runs'] += 1
+            self._stats['last_gc'] = now
+        
+        return evicted_files, evicted_bytes
+    
+    def get_usage(self):
+        """Статистика использования хранилища"""
+        with self._lock:
+            items = list(self._index.items())
+            stats = dict(self._stats)
+        
+        by_root = {root: {'files': 0, 'bytes': 0} for root in self.roots}
+        workspaces = set()
+        for path, (size, _) in items:
+            for root in self.roots:
+                if path.startswith(root + os.sep):
+                    by_root[root]['files'] += 1
+                    by_root[root]['bytes'] += size
+                    relative = os.path.relpath(path, root).split(os.sep)
+                    if len(relative) > 1 and os.path.join(root, relative[0]) != self.blob_root:
+                        workspaces.add(relative[0])
+                    break
+        
+        usage = {
+            'total_files': len(items),
+            'total_bytes': sum(size for _, (size, _) in items),
+            'max_bytes': self.max_bytes,
+            'max_age': self.max_age,
+            'workspaces': len(workspaces),
+            'by_root': {os.path.basename(root): value for root, value in by_root.items()}
+        }
+        usage.update(stats)
+        return usage
+    
+    def _run(self):
+        while not self._stop.wait(self.gc_interval):
+            try:
+                self.collect_garbage()
+            except Exception:
+                # Ошибка одного прохода не должна останавливать фоновую сборку
+                continue
+    
+    def _scan(self):
+        """Построение индекса по файлам на диске"""
+        index = {}
+        for root in self.roots:
+            for directory, _, filenames in os.walk(root):
+                for filename in filenames:
+                    path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    index[path] = [stat.st_size, self._last_access(stat)]
+        with self._lock:
+            self._index = index
+    
+    def _mark_access(self, path):
+        """Запись времени обращения в atime файла, mtime сохраняется с точностью до наносекунд"""
+        now_ns = time.time_ns()
+        os.utime(path, ns=(now_ns, os.stat(path).st_mtime_ns))
+        return now_ns / 1e9
+    
+    @staticmethod
+    def _last_access(stat):
+        """Последнее обращение к файлу: запись (mtime) или отметка touch (atime)"""
+        return max(stat.st_atime, stat.st_mtime)
+    
+    def _remove_empty_directories(self):
+        """Удаление опустевших каталогов рабочих пространств"""
+        now = time.time()
+        for root in self.roots:
+            for directory, _, filenames in os.walk(root, topdown=False):
+                if directory == root or directory == self.blob_root or filenames:
+                    continue
+                with self._lock:
+                    try:
+                        if now - os.stat(directory).st_mtime > self.min_idle:
+                            os.rmdir(directory)
+                    except OSError:
+                        pass  # каталог не пуст или уже удален
@@ -2,8 +2,14 @@ import pandas as pd
 import numpy as np
 import json
 import os
+import threading
+import tracemalloc
+from contextlib import contextmanager
 from datetime import datetime
 
+# tracemalloc общий для процесса: профилируемые участки разных потоков выполняются по очереди
+_profile_lock = threading.RLock()
+
 def validate_dataframe(df):
     """Проверка корректности DataFrame"""
     if not isinstance(df, pd.DataFrame):
@@ -47,6 +53,29 @@ def detect_data_types(df):
     
     return data_types
 
+@contextmanager
+def track_peak_memory(profile, stage):
+    """Замер пикового прироста памяти (МБ) на этапе обработки"""
+    if profile is None:
+        yield
+        return
+    
+    with _profile_lock:
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            profile[stage] = round(max(peak - baseline, 0) / 1024 / 1024, 2)
+            if started:
+                tracemalloc.stop()
+
 def create_summary_report(df, output_path):
     """Создание отчета по данным"""
     report = {
@@ -74,6 +103,28 @@ def create_summary_report(df, output_path):
     
     return report
 
+def append_rows(df, filepath):
+    """Дописывание новых строк в файл данных"""
+    if filepath.endswith('.csv'):
+        header = pd.read_csv(filepath, nrows=0, encoding='utf-8').columns
+        
+        # Файл мог быть загружен без завершающего перевода строки
+        needs_newline = False
+        if os.path.getsize(filepath) > 0:
+            with open(filepath, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        
+        with open(filepath, 'a', encoding='utf-8', newline='') as f:
+            if needs_newline:
+                f.write('\n')
+            df.reindex(columns=header).to_csv(f, header=False, index=False)
+    elif filepath.endswith('.xlsx'):
+        existing = pd.read_excel(filepath)
+        pd.concat([existing, df], ignore_index=True).to_excel(filepath, index=False)
+    else:
+        raise ValueError("Неподдерживаемый формат файла")
+
 def save_clustering_results(data, labels, feature_names, output_dir, algorithm):
     """Сохранение результатов кластеризации"""
     os.makedirs(output_dir, exist_ok=True)
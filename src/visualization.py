@@ -12,7 +12,7 @@ class Visualizer:
         plt.style.use('seaborn-v0_8')
         self.color_palette = sns.color_palette("husl", 10)
     
-    def plot_clusters_2d(self, data, labels, algorithm='kmeans', save_path=None):
+    def plot_clusters_2d(self, data, labels, algorithm='kmeans', save_path=None, axis_label='Признак'):
         """Визуализация кластеров в 2D"""
         fig, ax = plt.subplots(figsize=(10, 8))
         
@@ -30,8 +30,8 @@ class Visualizer:
             ax.scatter(cluster_points[:, 0], cluster_points[:, 1],
                       c=[color], label=label_name, alpha=0.7, s=50)
         
-        ax.set_xlabel('Признак 1', fontsize=12)
-        ax.set_ylabel('Признак 2', fontsize=12)
+        ax.set_xlabel(f'{axis_label} 1', fontsize=12)
+        ax.set_ylabel(f'{axis_label} 2', fontsize=12)
         ax.set_title(f'Результаты кластеризации: {algorithm}', fontsize=14, fontweight='bold')
         ax.legend()
         ax.grid(True, alpha=0.3)
@@ -43,7 +43,7 @@ class Visualizer:
         
         return fig
     
-    def plot_clusters_3d(self, data, labels, algorithm='kmeans', save_path=None):
+    def plot_clusters_3d(self, data, labels, algorithm='kmeans', save_path=None, axis_label='Признак'):
         """Визуализация кластеров в 3D"""
         fig = plt.figure(figsize=(12, 10))
         ax = fig.add_subplot(111, projection='3d')
@@ -62,9 +62,9 @@ class Visualizer:
             ax.scatter(cluster_points[:, 0], cluster_points[:, 1], cluster_points[:, 2],
                       c=[color], label=label_name, alpha=0.7, s=50)
         
-        ax.set_xlabel('Признак 1', fontsize=11)
-        ax.set_ylabel('Признак 2', fontsize=11)
-        ax.set_zlabel('Признак 3', fontsize=11)
+        ax.set_xlabel(f'{axis_label} 1', fontsize=11)
+        ax.set_ylabel(f'{axis_label} 2', fontsize=11)
+        ax.set_zlabel(f'{axis_label} 3', fontsize=11)
         ax.set_title(f'3D визуализация: {algorithm}', fontsize=14, fontweight='bold')
         ax.legend()
         
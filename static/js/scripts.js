@@ -163,7 +163,7 @@ function updateAlgorithmParams(algorithm) {
             paramsHTML = `
                 <div class="form-group">
                     <label for="nClusters">Количество кластеров:</label>
-                    <input type="number" id="nClusters" name="nClusters" 
+                    <input type="number" id="nClusters" name="n_clusters" 
                            min="2" max="20" value="3" class="form-control">
                 </div>
                 <div class="form-group">
@@ -193,7 +193,7 @@ function updateAlgorithmParams(algorithm) {
             paramsHTML = `
                 <div class="form-group">
                     <label for="nClusters">Количество кластеров:</label>
-                    <input type="number" id="nClusters" name="nClusters" 
+                    <input type="number" id="nClusters" name="n_clusters" 
                            min="2" max="20" value="3" class="form-control">
                 </div>
                 <div class="form-group">
@@ -212,7 +212,7 @@ function updateAlgorithmParams(algorithm) {
             paramsHTML = `
                 <div class="form-group">
                     <label for="nClusters">Количество компонент:</label>
-                    <input type="number" id="nClusters" name="nClusters" 
+                    <input type="number" id="nClusters" name="n_clusters" 
                            min="2" max="20" value="3" class="form-control">
                 </div>
                 <div class="form-group">
@@ -231,7 +231,7 @@ function updateAlgorithmParams(algorithm) {
             paramsHTML = `
                 <div class="form-group">
                     <label for="nClusters">Количество кластеров:</label>
-                    <input type="number" id="nClusters" name="nClusters" 
+                    <input type="number" id="nClusters" name="n_clusters" 
                            min="2" max="20" value="3" class="form-control">
                 </div>
                 <div class="form-group">
@@ -243,6 +243,21 @@ function updateAlgorithmParams(algorithm) {
                 </div>
             `;
             break;
+            
+        case 'birch':
+            paramsHTML = `
+                <div class="form-group">
+                    <label for="nClusters">Количество кластеров:</label>
+                    <input type="number" id="nClusters" name="n_clusters" 
+                           min="2" max="20" value="3" class="form-control">
+                </div>
+                <div class="form-group">
+                    <label for="threshold">Порог радиуса подкластера:</label>
+                    <input type="number" id="threshold" name="threshold" 
+                           min="0.05" max="5" step="0.05" value="0.5" class="form-control">
+                </div>
+            `;
+            break;
     }
     
     paramsContainer.innerHTML = paramsHTML;
@@ -0,0 +1,104 @@
+import numpy as np
+from sklearn.cluster import Birch
+from sklearn.metrics import pairwise_distances_argmin
+from sklearn.preprocessing import StandardScaler
+
+from src.incremental import IncrementalClustering
+
+def _initialize(state_path, data, n_clusters=3, dataset=None):
+    scaler = StandardScaler(copy=False)
+    data_scaled = scaler.fit_transform(data.copy())
+    model = Birch(n_clusters=n_clusters, threshold=0.3, branching_factor=5)
+    labels = model.fit_predict(data_scaled)
+    
+    incremental = IncrementalClustering(state_path)
+    incremental.initialize(data_scaled, scaler, ['x', 'y'], model, labels, n_clusters, dataset=dataset)
+    return incremental
+
+def _check_consistency(state, new_rows):
+    """Метки строк согласованы с подкластерами, новые строки отнесены к ближайшим"""
+    model = state['model']
+    np.testing.assert_array_equal(state['labels'], state['subcluster_labels'][state['row_subclusters']])
+    
+    scaled = state['scaler'].transform(new_rows.astype(state['dtype']))
+    nearest = pairwise_distances_argmin(scaled, model.subcluster_centers_)
+    np.testing.assert_array_equal(state['row_subclusters'][-len(new_rows):], nearest)
+
+def test_append_remaps_rows_after_split_and_reload(tmp_path):
+    rng = np.random.RandomState(0)
+    state_path = str(tmp_path / 'birch.joblib')
+    _initialize(state_path, rng.randn(300, 2))
+    
+    # Пометки на объектах подкластеров переживают сохранение и позволяют проследить
+    # каждый подкластер после разбиений узлов
+    incremental = IncrementalClustering(state_path)
+    for i, subcluster in enumerate(incremental._leaf_subclusters()):
+        subcluster.test_id = i
+    owners = incremental.state['row_subclusters'].copy()
+    n_leaves = len(incremental._leaves())
+    
+    appended = rng.randn(300, 2) * 2 + 3
+    incremental.append(appended.copy())  # строки масштабируются на месте
+    assert len(incremental._leaves()) > n_leaves
+    
+    reloaded = IncrementalClustering(state_path)
+    state = reloaded.state
+    subclusters = reloaded._leaf_subclusters()
+    
+    assert len(state['labels']) == len(state['row_subclusters']) == 600
+    np.testing.assert_allclose([subcluster.centroid_ for subcluster in subclusters],
+                               state['model'].subcluster_centers_)
+    # Старые строки указывают на те же объекты подкластеров, что и до добавления
+    assert [subclusters[j].test_id for j in state['row_subclusters'][:300]] == owners.tolist()
+    _check_consistency(state, appended)
+    
+    # Восстановленное дерево продолжает пополняться
+    appended = rng.randn(100, 2) - 3
+    summary = reloaded.append(appended.copy())
+    assert summary['n_new_rows'] == 100
+    assert len(reloaded.state['labels']) == 700
+    _check_consistency(reloaded.state, appended)
+
+def test_append_keeps_cluster_ids_of_unchanged_rows(tmp_path):
+    rng = np.random.RandomState(1)
+    centers = np.array([[0, 0], [8, 0], [0, 8]])
+    data = np.vstack([center + rng.randn(100, 2) * 0.3 for center in centers])
+    incremental = _initialize(str(tmp_path / 'birch.joblib'), data)
+    labels = incremental.state['labels'].copy()
+    
+    # Новые строки из тех же групп не меняют глобальные кластеры
+    summary = incremental.append(np.vstack([center + rng.randn(20, 2) * 0.3 for center in centers]))
+    
+    assert summary['n_clusters'] == 3
+    assert summary['n_affected_rows'] == 0
+    np.testing.assert_array_equal(incremental.state['labels'][:300], labels)
+
+def test_append_fills_missing_values_with_training_means(tmp_path):
+    rng = np.random.RandomState(2)
+    incremental = _initialize(str(tmp_path / 'birch.joblib'), rng.randn(300, 2) * [1, 3] + [10, -5])
+    scaler = incremental.state['scaler']
+    
+    # Среднее партии по столбцу x равно 100, но пропуск заполняется средним обучения
+    incremental.append(np.array([[np.nan, 1.0], [100.0, 1.0]]))
+    expected = scaler.transform(np.array([[scaler.mean_[0], 1.0]]))
+    nearest = pairwise_distances_argmin(expected, incremental.state['model'].subcluster_centers_)
+    assert incremental.state['row_subclusters'][-2] == nearest[0]
+    
+    # Полностью пустой столбец партии не приводит к ошибке NaN в sklearn
+    summary = incremental.append(np.array([[np.nan, 0.0], [np.nan, 2.0]]))
+    assert summary['n_new_rows'] == 2
+    assert len(incremental.state['labels']) == 304
+
+def test_dataset_version_detects_changed_file(tmp_path):
+    dataset = tmp_path / 'data.csv'
+    dataset.write_text('x,y\n1,2\n')
+    rng = np.random.RandomState(3)
+    incremental = _initialize(str(tmp_path / 'birch.joblib'), rng.randn(50, 2), dataset=str(dataset))
+    assert IncrementalClustering(incremental.state_path).matches_dataset(str(dataset))
+    
+    with open(dataset, 'a') as f:
+        f.write('3,4\n')
+    assert not incremental.matches_dataset(str(dataset))
+    
+    incremental.append(np.array([[3.0, 4.0]]), dataset=str(dataset))
+    assert IncrementalClustering(incremental.state_path).matches_dataset(str(dataset))
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from src.clustering import ClusteringAlgorithms
+
+def _low_rank(n_samples=1000, rank=30, n_features=200, seed=0):
+    rng = np.random.RandomState(seed)
+    data = rng.randn(n_samples, rank) @ rng.randn(rank, n_features) + 0.5 * rng.randn(n_samples, n_features)
+    return data.astype(np.float32)
+
+def test_variance_threshold_beyond_initial_components_is_reached():
+    # Некоррелированные признаки требуют больше 50 компонент: порог достигается удвоением
+    clusterer = ClusteringAlgorithms(dtype=np.float32)
+    data = clusterer.prepare_data(np.random.RandomState(1).randn(1000, 120))
+    
+    reduced = clusterer.reduce_dimensionality(data, variance_threshold=0.95)
+    info = clusterer.reduction_info
+    
+    assert info['n_components'] > 50
+    assert info['explained_variance'] >= 0.95
+    assert info['threshold_reached'] is True
+    assert reduced.shape == (1000, info['n_components'])
+
+@pytest.mark.parametrize('method', ['pca', 'incremental_pca'])
+def test_threshold_keeps_minimal_number_of_components(method):
+    clusterer = ClusteringAlgorithms(dtype=np.float32)
+    data = clusterer.prepare_data(_low_rank())
+    
+    reduced = clusterer.reduce_dimensionality(data, method=method, variance_threshold=0.9)
+    n_components = clusterer.reduction_info['n_components']
+    ratios = np.cumsum(clusterer.reducer.explained_variance_ratio_)
+    
+    assert ratios[n_components - 1] >= 0.9 > ratios[n_components - 2]
+    assert reduced.dtype == np.float32 and reduced.flags.c_contiguous
+    # Обученная модель не усекается: результат - первые компоненты ее преобразования
+    assert clusterer.reducer.n_components_ >= n_components
+    np.testing.assert_allclose(reduced, clusterer.reducer.transform(data)[:, :n_components], rtol=1e-4, atol=1e-4)
+
+def test_unreached_threshold_warns_and_is_recorded():
+    clusterer = ClusteringAlgorithms(dtype=np.float32)
+    data = clusterer.prepare_data(_low_rank())
+    
+    with pytest.warns(UserWarning):
+        reduced = clusterer.reduce_dimensionality(data, variance_threshold=0.99, max_components=10)
+    
+    assert reduced.shape[1] == 10
+    assert clusterer.reduction_info['threshold_reached'] is False
+
+def test_random_projection_requires_reducing_component_count():
+    clusterer = ClusteringAlgorithms(dtype=np.float32)
+    data = clusterer.prepare_data(_low_rank(n_features=40))
+    
+    with pytest.raises(ValueError):
+        clusterer.reduce_dimensionality(data, method='random_projection', variance_threshold=0.9)
+    with pytest.raises(ValueError):
+        clusterer.reduce_dimensionality(data, method='random_projection', n_components=40)
+    
+    reduced = clusterer.reduce_dimensionality(data, method='random_projection', n_components=8)
+    assert reduced.shape == (1000, 8)
+    assert clusterer.reduction_info['explained_variance'] is None
+
+def test_unknown_method_is_rejected():
+    clusterer = ClusteringAlgorithms()
+    with pytest.raises(ValueError):
+        clusterer.reduce_dimensionality(np.zeros((10, 3)), method='tsne')
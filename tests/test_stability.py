@@ -0,0 +1,119 @@
+import time
+
+import numpy as np
+import pytest
+from sklearn.metrics import adjusted_rand_score
+
+import src.clustering as clustering
+from src.clustering import ClusteringAlgorithms, _match_labels
+
+def _blobs(n_per_cluster=100, seed=0):
+    rng = np.random.RandomState(seed)
+    centers = np.array([[0, 0], [10, 0], [0, 10]])
+    return np.vstack([center + rng.randn(n_per_cluster, 2) for center in centers])
+
+@pytest.mark.parametrize('seed', range(5))
+def test_ari_matches_sklearn_without_noise(seed):
+    rng = np.random.RandomState(seed)
+    reference = rng.randint(0, 4, 300)
+    labels = np.where(rng.rand(300) < 0.7, reference, rng.randint(0, 5, 300))
+    
+    ari, _ = _match_labels(reference, labels)
+    assert ari == pytest.approx(adjusted_rand_score(reference, labels))
+
+def test_noise_in_refit_is_not_a_cluster():
+    ari, jaccard = _match_labels(np.array([0] * 50 + [1] * 50), np.array([-1] * 50 + [0] * 50))
+    
+    assert ari < 0.6
+    np.testing.assert_array_equal(jaccard, [0, 1])
+
+def test_noise_points_count_as_singletons_in_ari():
+    rng = np.random.RandomState(1)
+    reference = rng.randint(-1, 3, 200)
+    labels = rng.randint(-1, 3, 200)
+    
+    # Эквивалентное разбиение без шума: каждая точка шума - собственный кластер
+    def singletons(values, offset):
+        values = values.copy()
+        noise = values == -1
+        values[noise] = offset + np.arange(noise.sum())
+        return values
+    
+    ari, _ = _match_labels(reference, labels)
+    assert ari == pytest.approx(adjusted_rand_score(singletons(reference, 100), singletons(labels, 1000)))
+
+def test_relabelled_partition_is_perfectly_stable():
+    reference = np.repeat([0, 1, 2], 30)
+    ari, jaccard = _match_labels(reference, (reference + 1) % 3)
+    
+    assert ari == pytest.approx(1.0)
+    np.testing.assert_allclose(jaccard, 1.0)
+
+def test_all_noise_reference_is_not_reported_as_stable():
+    clusterer = ClusteringAlgorithms()
+    data = clusterer.prepare_data(np.random.RandomState(2).randn(200, 12))
+    
+    stability = clusterer.stability_analysis(data, 'dbscan', None, n_runs=5, n_jobs=1)
+    
+    assert stability['degenerate']
+    assert stability['mean_ari'] is None
+    assert not stability['converged']
+
+def test_stable_clustering_stops_early():
+    clusterer = ClusteringAlgorithms()
+    data = clusterer.prepare_data(_blobs())
+    
+    stability = clusterer.stability_analysis(data, 'kmeans', 3, n_runs=50, n_jobs=1, min_runs=10)
+    
+    assert stability['converged']
+    assert stability['n_runs'] == 10
+    assert stability['mean_ari'] == pytest.approx(1.0)
+    assert set(stability['cluster_stability']) == {'0', '1', '2'}
+
+def test_time_budget_is_respected_sequentially(monkeypatch):
+    fit_subsample = clustering._fit_subsample
+    def slow_fit_subsample(*args):
+        time.sleep(0.05)
+        return fit_subsample(*args)
+    monkeypatch.setattr(clustering, '_fit_subsample', slow_fit_subsample)
+    
+    clusterer = ClusteringAlgorithms()
+    data = clusterer.prepare_data(_blobs())
+    labels = clusterer.cluster_scaled(data, 'kmeans', 3)['labels']
+    
+    start = time.perf_counter()
+    stability = clusterer.stability_analysis(data, 'kmeans', 3, reference_labels=labels,
+                                             n_runs=100, n_jobs=1, tol=0, time_budget=0.5)
+    
+    assert 0 < stability['n_runs'] < 100
+    assert not stability['converged']
+    assert time.perf_counter() - start < 0.5 + 0.2
+
+def test_batch_is_skipped_when_estimated_fit_exceeds_budget():
+    clusterer = ClusteringAlgorithms()
+    data = clusterer.prepare_data(_blobs())
+    labels = clusterer.cluster_scaled(data, 'kmeans', 3)['labels']
+    
+    stability = clusterer.stability_analysis(data, 'kmeans', 3, reference_labels=labels, n_jobs=1,
+                                             time_budget=1, reference_fit_time=10)
+    
+    assert stability['n_runs'] == 0
+    assert stability['mean_ari'] is None
+    assert stability['elapsed'] < 1
+
+def test_quadratic_refits_run_one_at_a_time_above_row_limit(monkeypatch):
+    n_jobs_used = []
+    parallel = clustering.Parallel
+    def recording_parallel(n_jobs=None, **kwargs):
+        n_jobs_used.append(n_jobs)
+        return parallel(n_jobs=1, **kwargs)
+    monkeypatch.setattr(clustering, 'Parallel', recording_parallel)
+    
+    clusterer = ClusteringAlgorithms()
+    data = clusterer.prepare_data(_blobs(n_per_cluster=30))
+    clusterer.stability_analysis(data, 'hierarchical', 3, n_runs=2, n_jobs=4, max_quadratic_rows=50)
+    assert set(n_jobs_used) == {1}
+    
+    n_jobs_used.clear()
+    clusterer.stability_analysis(data, 'kmeans', 3, n_runs=2, n_jobs=4, max_quadratic_rows=50)
+    assert set(n_jobs_used) == {4}
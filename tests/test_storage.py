@@ -0,0 +1,113 @@
+import io
+import os
+import time
+
+from src.storage import StorageManager
+
+def _manager(tmp_path, **kwargs):
+    kwargs.setdefault('min_idle', 0)
+    roots = [str(tmp_path / 'uploads'), str(tmp_path / 'results')]
+    return StorageManager(roots=roots, blob_root=roots[0], **kwargs)
+
+def _write(manager, name, size, age=0):
+    """Файл в рабочем пространстве с временем последнего обращения age секунд назад"""
+    path = manager.workspace_path(manager.roots[1], 'workspace', name)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    _age(path, age)
+    return path
+
+def _age(path, age):
+    # Наносекунды, не представимые в float, выявляют потерю точности mtime
+    timestamp_ns = (time.time_ns() - int(age * 1e9)) // 1000 * 1000 + 987
+    os.utime(path, ns=(timestamp_ns, timestamp_ns))
+
+def test_store_upload_deduplicates_by_content(tmp_path):
+    manager = _manager(tmp_path)
+    first = manager.store_upload(io.BytesIO(b'a,b\n1,2\n'), 'data.csv')
+    second = manager.store_upload(io.BytesIO(b'a,b\n1,2\n'), 'copy.csv')
+    other = manager.store_upload(io.BytesIO(b'a,b\n3,4\n'), 'data.csv')
+    
+    assert first == second != other
+    assert sorted(os.listdir(os.path.dirname(first))) == [os.path.basename(first)]
+    usage = manager.get_usage()
+    assert usage['dedup_hits'] == 1
+    assert usage['dedup_bytes_saved'] == 8
+    assert not [name for _, _, names in os.walk(manager.blob_root) for name in names if name.endswith('.part')]
+
+def test_dedup_hit_marks_blob_as_used(tmp_path):
+    manager = _manager(tmp_path, max_age=3600)
+    blob = manager.store_upload(io.BytesIO(b'a\n1\n'), 'data.csv')
+    _age(blob, 7200)
+    
+    assert manager.store_upload(io.BytesIO(b'a\n1\n'), 'data.csv') == blob
+    assert manager.collect_garbage() == (0, 0)
+    assert os.path.exists(blob)
+
+def test_collect_garbage_removes_files_older_than_max_age(tmp_path):
+    manager = _manager(tmp_path, max_age=3600)
+    stale = _write(manager, 'stale.png', 10, age=7200)
+    fresh = _write(manager, 'fresh.png', 10, age=60)
+    
+    assert manager.collect_garbage() == (1, 10)
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+
+def test_collect_garbage_evicts_least_recently_used_over_quota(tmp_path):
+    manager = _manager(tmp_path, max_bytes=250)
+    oldest = _write(manager, 'oldest.png', 100, age=300)
+    older = _write(manager, 'older.png', 100, age=200)
+    recent = _write(manager, 'recent.png', 100, age=100)
+    
+    assert manager.collect_garbage() == (1, 100)
+    assert not os.path.exists(oldest)
+    assert os.path.exists(older) and os.path.exists(recent)
+    assert manager.get_usage()['total_bytes'] == 200
+
+def test_touch_protects_file_from_eviction_and_keeps_mtime(tmp_path):
+    manager = _manager(tmp_path, max_age=3600)
+    path = _write(manager, 'model.joblib', 10, age=7200)
+    mtime_ns = os.stat(path).st_mtime_ns
+    
+    manager.touch(path)
+    
+    assert os.stat(path).st_mtime_ns == mtime_ns
+    assert manager.collect_garbage() == (0, 0)
+    assert os.path.exists(path)
+
+def test_min_idle_protects_recent_files_over_quota(tmp_path):
+    manager = _manager(tmp_path, max_bytes=50, min_idle=600)
+    recent = _write(manager, 'recent.png', 100, age=60)
+    idle = _write(manager, 'idle.png', 100, age=1200)
+    
+    assert manager.collect_garbage() == (1, 100)
+    assert os.path.exists(recent)
+    assert not os.path.exists(idle)
+
+def test_access_from_other_process_is_rechecked_before_removal(tmp_path):
+    manager = _manager(tmp_path, max_age=3600)
+    other_process = _manager(tmp_path, max_age=3600)
+    path = _write(manager, 'dataset.csv', 10, age=7200)
+    
+    # Обращение другого процесса приходится на момент между отбором кандидатов и удалением
+    scan = manager._scan
+    def scan_then_touch():
+        scan()
+        other_process.touch(path)
+    manager._scan = scan_then_touch
+    
+    assert manager.collect_garbage() == (0, 0)
+    assert os.path.exists(path)
+
+def test_move_transfers_index_entry(tmp_path):
+    manager = _manager(tmp_path)
+    source = _write(manager, 'state_a.joblib', 10)
+    manager.register(source)
+    destination = os.path.join(os.path.dirname(source), 'state_b.joblib')
+    
+    manager.move(source, destination)
+    
+    usage = manager.get_usage()
+    assert usage['total_files'] == 1
+    assert usage['total_bytes'] == 10
+    assert os.path.exists(destination) and not os.path.exists(source)